@@ -2,7 +2,11 @@
 Animation and frame objects
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
 import numpy as np
+from numpy.lib.format import open_memmap
 from scipy.spatial.transform import Rotation as Rot
 
 from model import Vertex, Normal, Model
@@ -12,6 +16,64 @@ class Animation(object):
         self.groups = groups
         self.frames = frames
 
+    @property
+    def frame_indices(self) -> np.ndarray:
+        """\
+The game frame index of each stored frame. For new style animations
+only keyframes are stored, so these are not consecutive."""
+        return np.array([f.index for f in self.frames], dtype=np.int64)
+
+    def bake(self, model, dtype=np.float32, filename:Optional[str]=None,
+             chunk_size:int=32, threads:Optional[int]=None) -> Tuple[np.ndarray, np.ndarray]:
+        """\
+Applies every stored frame of the animation to the model, returning
+arrays of the transformed positions and normals with shape
+(frames, vertices, 3). For new style animations only the stored
+keyframes are baked (stored_frames rather than num_frames), without
+interpolating between them; row i belongs to game frame
+frame_indices[i]. Frames are processed in chunks of chunk_size on a
+pool of threads (threads=None uses ThreadPoolExecutor's default
+number of workers, threads=1 bakes in the current thread), so memory
+use beyond the output stays bounded.
+
+dtype sets the type of the output (e.g. np.float16 to halve its
+size). If filename is given, the output is memory-mapped to
+filename_positions.npy and filename_normals.npy instead of being
+held in memory.
+"""
+        verts, norms, groups = _model_arrays(model)
+        members = _group_members(groups)
+        rots, trans = _frame_arrays(self.frames)
+        shape = (len(self.frames), len(verts), 3)
+
+        if filename is None:
+            positions = np.empty(shape, dtype=dtype)
+            normals = np.empty(shape, dtype=dtype)
+        else:
+            positions = open_memmap(filename+"_positions.npy", mode="w+",
+                                    dtype=dtype, shape=shape)
+            normals = open_memmap(filename+"_normals.npy", mode="w+",
+                                  dtype=dtype, shape=shape)
+
+        def bake_chunk(start):
+            end = start+chunk_size
+            _transform(verts, norms, members, rots[start:end], trans[start:end],
+                       positions[start:end], normals[start:end])
+
+        starts = range(0, len(self.frames), chunk_size)
+        if threads == 1:
+            for start in starts:
+                bake_chunk(start)
+        else:
+            with ThreadPoolExecutor(threads) as pool:
+                # consume the results so exceptions are raised here
+                list(pool.map(bake_chunk, starts))
+
+        if filename is not None:
+            positions.flush()
+            normals.flush()
+        return positions, normals
+
 class Frame(object):
     def __init__(self, index, subframes):
         self.index = index
@@ -23,32 +85,52 @@ class Frame(object):
 Produces a new model with the rotation and translation
 applied to the correct vertex groups.
 """
-        verts = model.verts
-        norms = model.norms
-
-        # transform all verts and norms
-        newverts = []
-        newnorms = []
-        for i in range(len(verts)):
-            group = verts[i].group
-            sf = self.subframes[group]
-            rot_matrix = sf.rot.as_dcm()
-            v_rotated = verts[i].r.dot(rot_matrix)
-            v_rotated += sf.trans
-            newvert = Vertex(v_rotated[0],
-                             v_rotated[1],
-                             v_rotated[2],
-                             group)
-            
-            n_rotated = norms[i].r.dot(rot_matrix)
-            newnorm = Normal(n_rotated[0],
-                             n_rotated[1],
-                             n_rotated[2],
-                             group)
-            newverts.append(newvert)
-            newnorms.append(newnorm)
+        verts, norms, groups = _model_arrays(model)
+        rots, trans = _frame_arrays([self])
+        newverts = np.empty((1, len(verts), 3))
+        newnorms = np.empty((1, len(norms), 3))
+        _transform(verts, norms, _group_members(groups), rots, trans,
+                   newverts, newnorms)
+
+        newverts = [Vertex(v[0], v[1], v[2], g)
+                    for v, g in zip(newverts[0], groups)]
+        newnorms = [Normal(n[0], n[1], n[2], g)
+                    for n, g in zip(newnorms[0], groups)]
         return Model(newverts, newnorms, model.faces[:], model.groups)
 
+def _model_arrays(model) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    verts = np.array([v.r for v in model.verts], dtype=np.float64).reshape(-1, 3)
+    norms = np.array([n.r for n in model.norms], dtype=np.float64).reshape(-1, 3)
+    groups = np.array([v.group for v in model.verts], dtype=np.int64)
+    return verts, norms, groups
+
+def _frame_arrays(frames) -> Tuple[np.ndarray, np.ndarray]:
+    """\
+Stacks the rotation matrices and translations of frames into arrays
+of shape (frames, groups, 3, 3) and (frames, groups, 3)."""
+    rots = np.array([[sf.rot.as_matrix() for sf in f.subframes] for f in frames],
+                    dtype=np.float64)
+    trans = np.array([[sf.trans for sf in f.subframes] for f in frames],
+                     dtype=np.float64)
+    return rots, trans
+
+def _group_members(groups) -> List[Tuple[int, np.ndarray]]:
+    """\
+Returns the indices of the vertices in each group."""
+    return [(g, np.flatnonzero(groups == g)) for g in np.unique(groups)]
+
+def _transform(verts, norms, members, rots, trans, newverts, newnorms):
+    """\
+Writes the vertices and normals transformed by each of the frames
+in rots and trans into newverts and newnorms, which have shape
+(frames, vertices, 3). Each group is transformed separately so the
+temporaries are no larger than the output."""
+    for g, idx in members:
+        # vertices are row vectors, so each one is multiplied by the
+        # rotation matrix of its group on the right
+        newverts[:, idx] = np.matmul(verts[idx], rots[:, g]) + trans[:, g, None, :]
+        newnorms[:, idx] = np.matmul(norms[idx], rots[:, g])
+
 class Subframe(object):
     def __init__(self, group, rot, trans):
         self.group = group # redundant but good to store
@@ -80,5 +162,5 @@ in tuple or list format and converts them to rot
 objects.
 """
         # construct a scipy rotation object
-        rot = Rot.from_matrix(quat)
+        rot = Rot.from_matrix(matrix)
         super().__init__(group, rot, trans)
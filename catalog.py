@@ -0,0 +1,217 @@
+"""\
+Indexes the models and animations of many WAD files into a SQLite
+catalog, so they can be searched without re-parsing the WADs.
+"""
+
+import os
+import struct
+import sqlite3
+from multiprocessing import Pool
+from typing import List, Optional
+
+from util import hash_file
+from xspd import XSPD, find_offset
+
+SCHEMA = """\
+CREATE TABLE IF NOT EXISTS wads (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    xspd_offset INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS models (
+    wad_id INTEGER NOT NULL REFERENCES wads(id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    vertices INTEGER NOT NULL,
+    faces INTEGER NOT NULL,
+    groups INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (wad_id, idx)
+);
+CREATE TABLE IF NOT EXISTS anims (
+    wad_id INTEGER NOT NULL REFERENCES wads(id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    new INTEGER NOT NULL,
+    num_frames INTEGER NOT NULL,
+    stored_frames INTEGER NOT NULL,
+    groups INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (wad_id, idx)
+);
+CREATE INDEX IF NOT EXISTS models_groups ON models(groups);
+CREATE INDEX IF NOT EXISTS anims_groups ON anims(groups);
+"""
+
+MODEL_COLUMNS = ["idx", "offset", "size", "vertices", "faces", "groups", "hash"]
+ANIM_COLUMNS = ["idx", "offset", "size", "new", "num_frames", "stored_frames",
+                "groups", "hash"]
+
+def scan_wad(fn:str, known_hash:Optional[str]=None) -> dict:
+    """\
+Scans the WAD file at fn, returning a dict of its metadata and the
+metadata of its models and animations. If the hash of the file
+matches known_hash, the file is not parsed and only its hash is
+returned. If the file cannot be parsed, the reason is stored under
+"error" and no models or animations are returned. This runs in the
+worker processes of Catalog.update."""
+    st = os.stat(fn)
+    result = {"path": fn, "mtime": st.st_mtime, "size": st.st_size,
+              "hash": hash_file(fn)}
+    if result["hash"] == known_hash:
+        result["unchanged"] = True
+        return result
+
+    result["unchanged"] = False
+    result["xspd_offset"] = None
+    result["error"] = None
+    result["models"] = []
+    result["anims"] = []
+    try:
+        result["xspd_offset"] = offset = find_offset(fn)
+        if offset is not None:
+            block = XSPD(fn, offset)
+            models = [tuple(m) for m in block.scan_models()]
+            anims = [tuple(a) for a in block.scan_anims()]
+            result["models"], result["anims"] = models, anims
+    except (AssertionError, struct.error, ValueError) as e:
+        # unknown header layouts (e.g. Harry Potter 2) and truncated
+        # blocks shouldn't stop the other WADs from being indexed
+        result["error"] = str(e) or type(e).__name__
+    return result
+
+def _scan_wad_args(args):
+    return scan_wad(*args)
+
+class Catalog(object):
+    def __init__(self, fn:str):
+        """\
+SQLite catalog of the models and animations in a set of WAD files.
+fn is the path to the database, which will be created if it does not
+exist (use ":memory:" for a temporary catalog).
+"""
+        self.filename = fn
+        self.db = sqlite3.connect(fn)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def update(self, paths:List[str], processes:Optional[int]=None, prune:bool=False) -> List[str]:
+        """\
+Scans the WAD files in paths and records them in the catalog. Files
+whose mtime and size match the catalog are skipped, and files whose
+contents hash to the same value are not re-parsed. Scanning is done
+in a pool of worker processes (processes=None uses one per CPU,
+processes=1 scans in the current process). If prune is True, WADs in
+the catalog that are not in paths are removed. WADs that fail to parse
+are recorded with the reason and no models or animations (see
+errors).
+Returns the paths that were rescanned."""
+        paths = [os.path.abspath(p) for p in paths]
+        known = {row["path"]: row for row in self.db.execute("SELECT * FROM wads")}
+
+        jobs = []
+        for p in paths:
+            row = known.get(p)
+            if row is not None:
+                st = os.stat(p)
+                if row["mtime"] == st.st_mtime and row["size"] == st.st_size:
+                    continue
+            jobs.append((p, row["hash"] if row is not None else None))
+
+        if processes == 1 or len(jobs) <= 1:
+            self._store(map(_scan_wad_args, jobs))
+        else:
+            with Pool(processes) as pool:
+                self._store(pool.imap_unordered(_scan_wad_args, jobs))
+
+        if prune:
+            wanted = set(paths)
+            with self.db:
+                for p in known:
+                    if p not in wanted:
+                        self.db.execute("DELETE FROM wads WHERE path = ?", (p,))
+
+        return [j[0] for j in jobs]
+
+    def _store(self, results):
+        for r in results:
+            with self.db:
+                if r["unchanged"]:
+                    self.db.execute("UPDATE wads SET mtime = ?, size = ? WHERE path = ?",
+                                    (r["mtime"], r["size"], r["path"]))
+                    continue
+                self.db.execute("DELETE FROM wads WHERE path = ?", (r["path"],))
+                cur = self.db.execute(
+                    "INSERT INTO wads (path, mtime, size, hash, xspd_offset, error) VALUES (?, ?, ?, ?, ?, ?)",
+                    (r["path"], r["mtime"], r["size"], r["hash"], r["xspd_offset"], r["error"]))
+                wad_id = cur.lastrowid
+                self.db.executemany(
+                    "INSERT INTO models VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(wad_id,)+m for m in r["models"]])
+                self.db.executemany(
+                    "INSERT INTO anims VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(wad_id,)+a for a in r["anims"]])
+
+    def errors(self) -> List[sqlite3.Row]:
+        """\
+Returns the path and error of every WAD that could not be parsed."""
+        return self.db.execute(
+            "SELECT path, error FROM wads WHERE error IS NOT NULL ORDER BY path").fetchall()
+
+    def _find(self, table:str, columns:List[str], criteria:dict) -> List[sqlite3.Row]:
+        where = []
+        values = []
+        for key, value in criteria.items():
+            if key not in columns:
+                raise ValueError("unknown column: "+key)
+            where.append("{t}.{k} = ?".format(t=table, k=key))
+            values.append(value)
+        query = "SELECT wads.path, {t}.* FROM {t} JOIN wads ON wads.id = {t}.wad_id".format(t=table)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY wads.path, {t}.idx".format(t=table)
+        return self.db.execute(query, values).fetchall()
+
+    def find_models(self, **criteria) -> List[sqlite3.Row]:
+        """\
+Finds models matching the given column values, e.g.
+find_models(groups=12). Each row includes the path of its WAD."""
+        return self._find("models", MODEL_COLUMNS, criteria)
+
+    def find_anims(self, **criteria) -> List[sqlite3.Row]:
+        """\
+Finds animations matching the given column values, e.g.
+find_anims(groups=12, new=True). Each row includes the path of its
+WAD."""
+        return self._find("anims", ANIM_COLUMNS, criteria)
+
+    def anims_for_model(self, path:str, index:int, same_wad:bool=False) -> List[sqlite3.Row]:
+        """\
+Finds the animations that can be applied to model number index of the
+WAD at path, i.e. those with the same number of vertex groups. If
+same_wad is True, only animations from the same WAD are returned."""
+        path = os.path.abspath(path)
+        row = self.db.execute(
+            "SELECT models.groups, models.wad_id FROM models JOIN wads ON wads.id = models.wad_id"
+            " WHERE wads.path = ? AND models.idx = ?", (path, index)).fetchone()
+        if row is None:
+            raise KeyError((path, index))
+        if same_wad:
+            return [a for a in self.find_anims(groups=row["groups"]) if a["path"] == path]
+        return self.find_anims(groups=row["groups"])
@@ -0,0 +1,342 @@
+"""\
+Access layer for raw CD images (BIN/CUE, 2352-byte Mode 2 sectors).
+
+Files are located through the ISO9660 file system and exposed as
+file-like objects that map file offsets onto the user data of the
+underlying sectors, so that the archive and XSPD readers can use them
+directly without extracting anything. Writes patch the image in place
+and regenerate the EDC/ECC of the touched sectors only.
+"""
+
+import io
+import os
+import struct
+from collections import namedtuple
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+
+# raw sector layout (Mode 2)
+SECTOR_SIZE = 2352
+SYNC = b"\x00" + b"\xff"*10 + b"\x00"
+HEADER_OFFSET = 12
+SUBHEADER_OFFSET = 16
+DATA_OFFSET = 24
+
+# Form 1 sectors carry 2048 bytes of data followed by EDC and P/Q parity
+FORM1_DATA_SIZE = 2048
+FORM1_EDC_OFFSET = DATA_OFFSET + FORM1_DATA_SIZE
+FORM1_P_OFFSET = FORM1_EDC_OFFSET + 4
+FORM1_Q_OFFSET = FORM1_P_OFFSET + 172
+
+# Form 2 sectors carry 2324 bytes of data followed by an (optional) EDC
+FORM2_DATA_SIZE = 2324
+FORM2_EDC_OFFSET = DATA_OFFSET + FORM2_DATA_SIZE
+
+# submode bit in the subheader that marks a Form 2 sector
+SUBMODE_FORM2 = 0x20
+
+# ISO9660
+PVD_LBA = 16
+ROOT_RECORD_OFFSET = 156
+DIRECTORY_FLAG = 0x02
+
+DirRecord = namedtuple("DirRecord", ["name", "lba", "size", "is_dir"])
+
+def _build_luts():
+    ecc_f = np.zeros(256, dtype=np.uint8)
+    ecc_b = np.zeros(256, dtype=np.uint8)
+    edc = np.zeros(256, dtype=np.uint32)
+    for i in range(256):
+        j = ((i << 1) ^ (0x11D if i & 0x80 else 0)) & 0xFF
+        ecc_f[i] = j
+        ecc_b[i ^ j] = i
+        e = i
+        for k in range(8):
+            e = (e >> 1) ^ (0xD8018001 if e & 1 else 0)
+        edc[i] = e
+    return ecc_f, ecc_b, edc
+
+ECC_F_LUT, ECC_B_LUT, EDC_LUT = _build_luts()
+
+@lru_cache(maxsize=None)
+def _edc_table(length:int) -> np.ndarray:
+    """\
+The EDC is a CRC with a zero initial value, so it is linear in the
+input bytes. This builds a table of the contribution of every possible
+byte value at every position of a block of the given length, which
+lets the EDC of many sectors be computed with a single lookup and
+XOR-reduction."""
+    table = np.empty((length, 256), dtype=np.uint32)
+    table[-1] = EDC_LUT
+    for pos in range(length-2, -1, -1):
+        prev = table[pos+1]
+        table[pos] = (prev >> 8) ^ EDC_LUT[prev & 0xFF]
+    return table
+
+def compute_edc(blocks:np.ndarray) -> np.ndarray:
+    """\
+Computes the EDC of each row of a (sectors, length) uint8 array."""
+    table = _edc_table(blocks.shape[1])
+    contrib = table[np.arange(blocks.shape[1]), blocks]
+    return np.bitwise_xor.reduce(contrib, axis=1)
+
+@lru_cache(maxsize=None)
+def _ecc_indices(major_count:int, minor_count:int, major_mult:int, minor_inc:int) -> np.ndarray:
+    size = major_count*minor_count
+    major = np.arange(major_count)
+    start = (major >> 1)*major_mult + (major & 1)
+    return (start[:,None] + np.arange(minor_count)[None,:]*minor_inc) % size
+
+def _compute_ecc_block(src:np.ndarray, major_count:int, minor_count:int,
+                       major_mult:int, minor_inc:int) -> np.ndarray:
+    idx = _ecc_indices(major_count, minor_count, major_mult, minor_inc)
+    temp = src[:, idx] # (sectors, major, minor)
+    ecc_a = np.zeros(temp.shape[:2], dtype=np.uint8)
+    ecc_b = np.bitwise_xor.reduce(temp, axis=2)
+    for minor in range(minor_count):
+        ecc_a = ECC_F_LUT[ecc_a ^ temp[:,:,minor]]
+    ecc_a = ECC_B_LUT[ECC_F_LUT[ecc_a] ^ ecc_b]
+    return np.concatenate((ecc_a, ecc_a ^ ecc_b), axis=1)
+
+def regenerate_sectors(raw:np.ndarray):
+    """\
+Regenerates the EDC (and, for Form 1, the P/Q parity) of a
+(sectors, 2352) uint8 array of raw Mode 2 sectors in place."""
+    form2 = (raw[:, SUBHEADER_OFFSET+2] & SUBMODE_FORM2) != 0
+
+    if form2.any():
+        f2 = raw[form2]
+        edc = compute_edc(f2[:, SUBHEADER_OFFSET:FORM2_EDC_OFFSET])
+        f2[:, FORM2_EDC_OFFSET:] = edc.astype("<u4").view(np.uint8).reshape(-1, 4)
+        raw[form2] = f2
+
+    form1 = ~form2
+    if form1.any():
+        f1 = raw[form1]
+        edc = compute_edc(f1[:, SUBHEADER_OFFSET:FORM1_EDC_OFFSET])
+        f1[:, FORM1_EDC_OFFSET:FORM1_P_OFFSET] = edc.astype("<u4").view(np.uint8).reshape(-1, 4)
+
+        # the header is treated as zero for Mode 2 ECC
+        src = f1[:, HEADER_OFFSET:FORM1_Q_OFFSET].copy()
+        src[:, :SUBHEADER_OFFSET-HEADER_OFFSET] = 0
+        p = _compute_ecc_block(src, 86, 24, 2, 86)
+        f1[:, FORM1_P_OFFSET:FORM1_Q_OFFSET] = p
+        src[:, FORM1_P_OFFSET-HEADER_OFFSET:] = p
+        f1[:, FORM1_Q_OFFSET:] = _compute_ecc_block(src, 52, 43, 86, 88)
+        raw[form1] = f1
+
+def _check_form1(raw:np.ndarray):
+    if (raw[:, SUBHEADER_OFFSET+2] & SUBMODE_FORM2).any():
+        raise ValueError("Form 2 sectors do not hold Form 1 user data")
+
+def read_cue(fn:str) -> str:
+    """\
+Reads a .cue sheet and returns the path of the .bin file for its
+data track. Raises a ValueError if the track is not raw Mode 2."""
+    binfile = None
+    with open(fn, "r") as cue:
+        for line in cue:
+            parts = line.strip().split()
+            if not parts:
+                continue
+            if parts[0].upper() == "FILE" and binfile is None:
+                binfile = line.strip()[5:].rsplit(" ", 1)[0].strip().strip('"')
+            elif parts[0].upper() == "TRACK":
+                if parts[2].upper() != "MODE2/2352":
+                    raise ValueError("unsupported track mode: "+parts[2])
+                break
+    if binfile is None:
+        raise ValueError("no FILE entry in cue sheet")
+    return os.path.join(os.path.dirname(fn), binfile)
+
+class CDImage(object):
+    def __init__(self, fn:str, writable:bool=False):
+        """\
+Object representing a raw (2352 bytes per sector) Mode 2 CD image.
+fn may be the path to the .bin file or to its .cue sheet. If writable
+is True, the image is opened for in-place modification.
+"""
+        if fn.lower().endswith(".cue"):
+            fn = read_cue(fn)
+        self.filename = fn
+        self.writable = writable
+        self.file = open(fn, "r+b" if writable else "rb")
+        self.num_sectors = os.path.getsize(fn) // SECTOR_SIZE
+
+        # locate the root directory through the primary volume descriptor
+        pvd = self.read_data(PVD_LBA, 1)
+        assert pvd[1:6] == b"CD001"
+        self.root = self._parse_record(pvd[ROOT_RECORD_OFFSET:])
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read_sectors(self, lba:int, count:int=1) -> np.ndarray:
+        """\
+Reads count raw sectors starting at lba into a (count, 2352) array."""
+        if lba < 0 or lba+count > self.num_sectors:
+            raise ValueError("read past the end of the image")
+        self.file.seek(lba*SECTOR_SIZE)
+        data = self.file.read(count*SECTOR_SIZE)
+        return np.frombuffer(data, dtype=np.uint8).reshape(count, SECTOR_SIZE)
+
+    def read_data(self, lba:int, count:int=1) -> bytes:
+        """\
+Reads the Form 1 user data of count sectors starting at lba. Raises
+a ValueError if any of the sectors are Form 2."""
+        raw = self.read_sectors(lba, count)
+        _check_form1(raw)
+        return raw[:, DATA_OFFSET:FORM1_EDC_OFFSET].tobytes()
+
+    def write_data(self, lba:int, offset:int, data:bytes):
+        """\
+Writes data into the user data of the sectors starting at lba,
+beginning offset bytes into the user data. The EDC/ECC of every
+sector that was touched is regenerated."""
+        if not self.writable:
+            raise io.UnsupportedOperation("image was not opened as writable")
+        if len(data) == 0:
+            return
+        first = lba + offset // FORM1_DATA_SIZE
+        last = lba + (offset+len(data)-1) // FORM1_DATA_SIZE
+        raw = self.read_sectors(first, last-first+1).copy()
+        _check_form1(raw)
+
+        start = offset % FORM1_DATA_SIZE
+        user = raw[:, DATA_OFFSET:FORM1_EDC_OFFSET].reshape(-1)
+        user[start:start+len(data)] = np.frombuffer(data, dtype=np.uint8)
+        raw[:, DATA_OFFSET:FORM1_EDC_OFFSET] = user.reshape(-1, FORM1_DATA_SIZE)
+        regenerate_sectors(raw)
+
+        self.file.seek(first*SECTOR_SIZE)
+        self.file.write(raw.tobytes())
+
+    def _parse_record(self, data:bytes) -> DirRecord:
+        lba = struct.unpack("<I", data[2:6])[0]
+        size = struct.unpack("<I", data[10:14])[0]
+        flags = data[25]
+        name_len = data[32]
+        name = data[33:33+name_len].decode("ascii").split(";")[0]
+        return DirRecord(name, lba, size, bool(flags & DIRECTORY_FLAG))
+
+    def _read_directory(self, record:DirRecord) -> List[DirRecord]:
+        count = (record.size + FORM1_DATA_SIZE - 1) // FORM1_DATA_SIZE
+        data = self.read_data(record.lba, count)
+        records = []
+        for s in range(count):
+            pos = s*FORM1_DATA_SIZE
+            end = pos + FORM1_DATA_SIZE
+            # records never cross a sector boundary; a zero length
+            # byte means the rest of the sector is padding
+            while pos < end and data[pos] != 0:
+                rec_len = data[pos]
+                rec = self._parse_record(data[pos:pos+rec_len])
+                if rec.name not in ("\x00", "\x01"): # skip . and ..
+                    records.append(rec)
+                pos += rec_len
+        return records
+
+    def listdir(self, path:str="") -> List[DirRecord]:
+        """\
+Lists the records in the directory at path."""
+        record = self.find(path)
+        if not record.is_dir:
+            raise NotADirectoryError(path)
+        return self._read_directory(record)
+
+    def find(self, path:str) -> DirRecord:
+        """\
+Finds the directory record for path. Path components may be separated
+by either / or \\ and are matched case-insensitively."""
+        record = self.root
+        for part in path.replace("\\", "/").split("/"):
+            if part == "":
+                continue
+            if not record.is_dir:
+                raise FileNotFoundError(path)
+            for rec in self._read_directory(record):
+                if rec.name.upper() == part.upper():
+                    record = rec
+                    break
+            else:
+                raise FileNotFoundError(path)
+        return record
+
+    def open(self, path:str) -> "CDFile":
+        """\
+Opens the file at path, returning a file-like object."""
+        record = self.find(path)
+        if record.is_dir:
+            raise IsADirectoryError(path)
+        return CDFile(self, record)
+
+class CDFile(io.RawIOBase):
+    def __init__(self, image:CDImage, record:DirRecord):
+        """\
+File-like view of a file on a CDImage. Offsets within the file are
+mapped onto the user data of the sectors it occupies. Writes are
+patched directly into the image and cannot extend the file.
+"""
+        super().__init__()
+        self.image = image
+        self.record = record
+        self.name = record.name
+        self.size = record.size
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return self.image.writable
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset:int, whence:int=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self.pos = offset
+        return self.pos
+
+    def readinto(self, b):
+        n = min(len(b), self.size-self.pos)
+        if n <= 0:
+            return 0
+        first = self.pos // FORM1_DATA_SIZE
+        last = (self.pos+n-1) // FORM1_DATA_SIZE
+        data = self.image.read_data(self.record.lba+first, last-first+1)
+        start = self.pos % FORM1_DATA_SIZE
+        b[:n] = data[start:start+n]
+        self.pos += n
+        return n
+
+    def flush(self):
+        super().flush()
+        if self.image.writable:
+            self.image.file.flush()
+
+    def write(self, b):
+        if not self.writable():
+            raise io.UnsupportedOperation("image was not opened as writable")
+        b = bytes(b)
+        if self.pos+len(b) > self.size:
+            raise ValueError("cannot write past the end of the file")
+        self.image.write_data(self.record.lba, self.pos, b)
+        self.pos += len(b)
+        return len(b)
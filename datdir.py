@@ -0,0 +1,100 @@
+"""\
+Reader for the .DAT/.DIR archive pair (e.g. POTTER.DAT/POTTER.DIR).
+"""
+
+import io
+import struct
+from collections import namedtuple
+from typing import List, Union
+
+from util import open_file
+
+DirEntry = namedtuple("DirEntry", ["name", "size", "offset"])
+
+def read_DIR(fn:Union[str, io.IOBase]) -> List[DirEntry]:
+    """\
+Reads the file listing from a .DIR file. fn may be a path or a
+file-like object (such as a cd.CDFile)."""
+    with open_file(fn) as f:
+        f.seek(0)
+        num_files = struct.unpack("<I", f.read(4))[0]
+        entries = []
+        for i in range(num_files):
+            name, size, offset = struct.unpack("<12sII", f.read(20))
+            name = name.rstrip(b"\x00").decode("ascii")
+            entries.append(DirEntry(name, size, offset))
+    return entries
+
+class FileView(io.RawIOBase):
+    def __init__(self, base:io.IOBase, offset:int, size:int, name:str=""):
+        """\
+File-like view of size bytes of base, starting at offset. Writes are
+passed through to base and cannot extend past the end of the view.
+"""
+        super().__init__()
+        self.base = base
+        self.offset = offset
+        self.size = size
+        self.name = name
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return self.base.writable()
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset:int, whence:int=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self.pos = offset
+        return self.pos
+
+    def readinto(self, b):
+        n = min(len(b), self.size-self.pos)
+        if n <= 0:
+            return 0
+        self.base.seek(self.offset+self.pos)
+        data = self.base.read(n)
+        b[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+    def write(self, b):
+        b = bytes(b)
+        if self.pos+len(b) > self.size:
+            raise ValueError("cannot write past the end of the file")
+        self.base.seek(self.offset+self.pos)
+        self.base.write(b)
+        self.pos += len(b)
+        return len(b)
+
+class DAT(object):
+    def __init__(self, dat:io.IOBase, dir:Union[str, io.IOBase]):
+        """\
+Object representing a .DAT/.DIR archive. dat should be a file-like
+object for the .DAT file (opened for writing if files are to be
+modified) and dir a path or file-like object for the .DIR file.
+"""
+        self.dat = dat
+        self.entries = {e.name.upper(): e for e in read_DIR(dir)}
+
+    def names(self) -> List[str]:
+        return list(self.entries.keys())
+
+    def open(self, name:str) -> FileView:
+        """\
+Opens the file called name inside the archive, returning a
+file-like object."""
+        entry = self.entries[name.upper()]
+        return FileView(self.dat, entry.offset, entry.size, entry.name)
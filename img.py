@@ -141,9 +141,9 @@ Converts a title text image (XX_TEXT.IMG).
 """
     return convert_palette_IMG(read_IMG(fp, TEXT_SIZE), TEXT_DIM)
 
-def convert_to_IMG(im:Image.Image, fp:str):
+def encode_IMG(im:Image.Image) -> bytes:
     """\
-Converts a PIL image into a non-palette IMG file.
+Converts a PIL image into the contents of a non-palette IMG file.
 """
     # convert the IMG to RGB
     im = im.convert("RGB")
@@ -152,50 +152,48 @@ Converts a PIL image into a non-palette IMG file.
     a = np.array(im)
     
     # scale each channel to 5-bit
-    scaled = np.round((a/255)*31).astype(np.uint8)
-
-    # convert to raw bytes and write to file
-    raw_data = b""
-    for y in range(scaled.shape[0]):
-        for x in range(scaled.shape[1]):
-            n = scaled[y,x,2]
-            n = n << 5
-            n += scaled[y,x,1]
-            n = n << 5
-            n += scaled[y,x,0]
-
-            raw_data += struct.pack("H", n)
-            
+    scaled = np.round((a/255)*31).astype(np.uint16)
+
+    # pack the channels into 15-bit colours
+    n = (scaled[:,:,2] << 10) | (scaled[:,:,1] << 5) | scaled[:,:,0]
+    return n.astype("<u2").tobytes()
+
+def convert_to_IMG(im:Image.Image, fp:str):
+    """\
+Converts a PIL image into a non-palette IMG file.
+"""
+    raw_data = encode_IMG(im)
     with open(fp, "wb") as f:
         f.write(raw_data)
 
-def convert_to_palette_IMG(im:Image.Image, fp:str):
+def encode_palette_IMG(im:Image.Image) -> bytes:
     """\
-Converts a PIL image into a palette IMG file.
+Converts a PIL image into the contents of a palette IMG file.
 """
     # convert the IMG to a palette
     im = im.convert("P", palette=Image.ADAPTIVE, colors=255)
     palette_bytes = im.getpalette()
+    # newer versions of PIL only return the colours that are used
+    palette_bytes += [0]*(768-len(palette_bytes))
     palette = [(palette_bytes[i], palette_bytes[i+1], palette_bytes[i+2]) for i in range(0, len(palette_bytes), 3)]
     HP_palette = palette[::-1]
 
     # write the palette to the raw_data
-    raw_data = b""
-    for colour in HP_palette:
-        n = int(round((colour[2]/255)*31))
-        n = n << 5
-        n += int(round((colour[1]/255)*31))
-        n = n << 5
-        n += int(round((colour[0]/255)*31))
-
-        raw_data += struct.pack("H", n)
+    scaled = np.round((np.array(HP_palette)/255)*31).astype(np.uint16)
+    n = (scaled[:,2] << 10) | (scaled[:,1] << 5) | scaled[:,0]
+    raw_data = n.astype("<u2").tobytes()
 
     assert len(raw_data) == 512
 
-    # write the image to the raw_data
-    pix = im.load()
-    for y in range(im.size[1]):
-        for x in range(im.size[0]):
-            raw_data += struct.pack("B", HP_palette.index(palette[pix[x,y]]))
+    # map PIL's palette indices onto the reversed palette
+    lut = np.array([HP_palette.index(colour) for colour in palette], dtype=np.uint8)
+    raw_data += lut[np.array(im)].tobytes()
+    return raw_data
+
+def convert_to_palette_IMG(im:Image.Image, fp:str):
+    """\
+Converts a PIL image into a palette IMG file.
+"""
+    raw_data = encode_palette_IMG(im)
     with open(fp, "wb") as f:
         f.write(raw_data)
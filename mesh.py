@@ -0,0 +1,192 @@
+"""\
+Mesh post-processing: triangulation, welding and vertex cache
+optimisation, producing compact vertex and index buffers.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+# parameters for the vertex cache optimisation (Tom Forsyth, "Linear-Speed
+# Vertex Cache Optimisation")
+CACHE_SIZE = 32
+CACHE_DECAY_POWER = 1.5
+LAST_TRI_SCORE = 0.75
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+
+def triangulate(faces) -> np.ndarray:
+    """\
+Converts a list of model.Face objects into a (triangles, 3) array of
+vertex indices. Quads are split along the same winding used by
+Model.save_obj."""
+    tris = []
+    for f in faces:
+        v = f.verts
+        if f.group == 0: # quad, wound v1 v2 v4 v3
+            tris.append((v[0], v[1], v[3]))
+            tris.append((v[0], v[3], v[2]))
+        else: # tri
+            tris.append((v[0], v[1], v[2]))
+    return np.array(tris, dtype=np.int64).reshape(-1, 3)
+
+def weld(positions:np.ndarray, normals:np.ndarray, groups:np.ndarray,
+         triangles:np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """\
+Merges vertices with identical positions, normals and vertex groups
+and remaps triangles onto them. Triangles that become degenerate are
+removed. Vertices are only merged within a group so that animations
+can still be applied to the result."""
+    key = np.concatenate((positions, normals, groups[:,None].astype(positions.dtype)), axis=1)
+    unique, first, inverse = np.unique(key, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    triangles = inverse[triangles]
+
+    degenerate = ((triangles[:,0] == triangles[:,1]) |
+                  (triangles[:,1] == triangles[:,2]) |
+                  (triangles[:,0] == triangles[:,2]))
+    triangles = triangles[~degenerate]
+    return positions[first], normals[first], groups[first], triangles
+
+def _vertex_score(cache_pos:int, remaining:int, cache_size:int) -> float:
+    if remaining == 0:
+        return -1.0
+    score = 0.0
+    if cache_pos >= 0:
+        if cache_pos < 3:
+            # the vertices of the last triangle get a fixed score so
+            # that strips aren't favoured over fans
+            score = LAST_TRI_SCORE
+        else:
+            score = (1 - (cache_pos-3)/(cache_size-3)) ** CACHE_DECAY_POWER
+    # boost vertices with few triangles left so they can be retired
+    score += VALENCE_BOOST_SCALE * remaining ** -VALENCE_BOOST_POWER
+    return score
+
+def optimise_vertex_cache(triangles:np.ndarray, num_vertices:int,
+                          cache_size:int=CACHE_SIZE) -> np.ndarray:
+    """\
+Reorders triangles to make better use of the GPU's post-transform
+vertex cache, using Forsyth's algorithm. Returns the reordered
+(triangles, 3) array."""
+    tris = np.asarray(triangles).tolist()
+    if len(tris) == 0:
+        return np.asarray(triangles).reshape(-1, 3)
+
+    vert_tris = [[] for v in range(num_vertices)] # type: List[List[int]]
+    for t, tri in enumerate(tris):
+        for v in tri:
+            vert_tris[v].append(t)
+
+    cache_pos = [-1]*num_vertices
+    vscore = [_vertex_score(-1, len(vert_tris[v]), cache_size)
+              for v in range(num_vertices)]
+    tscore = [sum(vscore[v] for v in tri) for tri in tris]
+    emitted = [False]*len(tris)
+
+    order = []
+    cache = [] # type: List[int]
+    best = max(range(len(tris)), key=tscore.__getitem__)
+    while True:
+        tri = tris[best]
+        emitted[best] = True
+        order.append(best)
+        for v in tri:
+            vert_tris[v].remove(best)
+
+        # move the triangle's vertices to the front of the cache; the
+        # vertices pushed out past the end are rescored as uncached
+        new_cache = list(tri) + [v for v in cache if v not in tri]
+        touched = set()
+        for i, v in enumerate(new_cache):
+            cache_pos[v] = i if i < cache_size else -1
+            vscore[v] = _vertex_score(cache_pos[v], len(vert_tris[v]), cache_size)
+            touched.update(vert_tris[v])
+        cache = new_cache[:cache_size]
+
+        if len(order) == len(tris):
+            break
+
+        # the next triangle is the best one using a cached vertex
+        best = -1
+        best_score = -1.0
+        for t in touched:
+            tscore[t] = sum(vscore[v] for v in tris[t])
+            if tscore[t] > best_score:
+                best, best_score = t, tscore[t]
+        if best < 0:
+            # nothing in the cache has triangles left, so start afresh
+            best = max((t for t in range(len(tris)) if not emitted[t]),
+                       key=tscore.__getitem__)
+
+    return np.asarray(triangles)[order]
+
+def reorder_vertices(triangles:np.ndarray, num_vertices:int) -> Tuple[np.ndarray, np.ndarray]:
+    """\
+Renumbers vertices in the order they are first used by triangles,
+which improves locality of vertex fetches. Returns the remapped
+triangles and the old index of each new vertex (unused vertices are
+dropped)."""
+    flat = np.asarray(triangles).reshape(-1)
+    used, first = np.unique(flat, return_index=True)
+    order = used[np.argsort(first)]
+    remap = np.full(num_vertices, -1, dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    return remap[flat].reshape(-1, 3), order
+
+def cache_miss_ratio(triangles:np.ndarray, cache_size:int=CACHE_SIZE) -> float:
+    """\
+Returns the average number of vertex cache misses per triangle (ACMR)
+for a FIFO cache of the given size."""
+    cache = [] # type: List[int]
+    misses = 0
+    for v in np.asarray(triangles).reshape(-1).tolist():
+        if v not in cache:
+            misses += 1
+            cache.append(v)
+            if len(cache) > cache_size:
+                cache.pop(0)
+    return misses / max(len(triangles), 1)
+
+class Mesh(object):
+    def __init__(self, positions, normals, groups, indices):
+        """\
+Indexed triangle mesh. positions and normals are (N, 3) float32
+arrays, groups an (N,) array of vertex groups and indices a flat
+array of 3 vertex indices per triangle (uint16 if possible, otherwise
+uint32).
+"""
+        self.positions = positions
+        self.normals = normals
+        self.groups = groups
+        self.indices = indices
+
+    def __repr__(self):
+        out = "{package}.Mesh({v} vertices, {t} triangles)"
+        return out.format(package=__name__,
+                          v=len(self.positions),
+                          t=len(self.indices)//3)
+
+    @property
+    def triangles(self) -> np.ndarray:
+        return self.indices.reshape(-1, 3)
+
+def build_mesh(positions:np.ndarray, normals:np.ndarray, groups:np.ndarray,
+               triangles:np.ndarray, weld_vertices:bool=True,
+               optimise:bool=True, cache_size:int=CACHE_SIZE) -> Mesh:
+    """\
+Builds a Mesh from per-vertex arrays and a (triangles, 3) index array,
+optionally welding duplicate vertices and optimising the triangle and
+vertex order for the vertex cache."""
+    if weld_vertices:
+        positions, normals, groups, triangles = weld(positions, normals, groups, triangles)
+    if optimise:
+        triangles = optimise_vertex_cache(triangles, len(positions), cache_size)
+        triangles, order = reorder_vertices(triangles, len(positions))
+        positions, normals, groups = positions[order], normals[order], groups[order]
+
+    index_type = np.uint16 if len(positions) <= 0xFFFF else np.uint32
+    return Mesh(np.ascontiguousarray(positions, dtype=np.float32),
+                np.ascontiguousarray(normals, dtype=np.float32),
+                np.ascontiguousarray(groups, dtype=np.uint16),
+                np.ascontiguousarray(triangles, dtype=index_type).reshape(-1))
@@ -1,5 +1,7 @@
 import numpy as np
 
+from mesh import Mesh, triangulate, build_mesh
+
 class Vec3(object):
     def __init__(self, x, y, z):
         self.r = np.array([x,y,z], dtype=np.float64)
@@ -39,6 +41,20 @@ Stores the data for a model and provides functions for exporting it
                           n=len(self.norms),
                           f=len(self.faces))
 
+    def to_mesh(self, weld:bool=True, optimise:bool=True) -> Mesh:
+        """\
+Converts the model into an indexed triangle mesh. Quads are
+triangulated with the same winding as save_obj. If weld is True,
+vertices with the same position, normal and group are merged, and
+if optimise is True, the triangles and vertices are reordered for
+the GPU's vertex cache.
+"""
+        positions = np.array([v.r for v in self.verts], dtype=np.float64).reshape(-1, 3)
+        normals = np.array([n.r for n in self.norms], dtype=np.float64).reshape(-1, 3)
+        groups = np.array([v.group for v in self.verts], dtype=np.int64)
+        return build_mesh(positions, normals, groups, triangulate(self.faces),
+                          weld, optimise)
+
     def save_obj(self, fn:str):
         """\
 Save the model as a Wavefront .obj file
@@ -0,0 +1,67 @@
+import unittest
+import os
+import shutil, tempfile
+
+import numpy as np
+
+import xspd
+from test.xspd_data import make_xspd, make_anim, SIMPLE_MODEL
+
+def rotation_frame(angle):
+    # rotation about z by angle for group 0, fixed translation for group 1
+    c, s = np.cos(angle/2), np.sin(angle/2)
+    quat = (int(c*4096), 0, 0, int(s*4096))
+    return [(quat, (0, 0, 0)), ((4096, 0, 0, 0), (4096, 0, -2048))]
+
+class AnimTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        fn = os.path.join(self.temp_dir, "test.wad")
+        frames = [rotation_frame(a) for a in np.linspace(0, np.pi, 10)]
+        with open(fn, "wb") as f:
+            f.write(make_xspd([SIMPLE_MODEL], [make_anim(2, frames)]))
+        block = xspd.XSPD(fn, 0)
+        self.model = block.read_models(0)
+        self.anim = block.read_anims()[0]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_bake_matches_apply_to_model(self):
+        positions, normals = self.anim.bake(self.model, dtype=np.float64, chunk_size=3)
+        self.assertEqual(positions.shape, (10, 7, 3))
+        for i, frame in enumerate(self.anim.frames):
+            posed = frame.apply_to_model(self.model)
+            self.assertTrue(np.allclose(positions[i], [v.r for v in posed.verts]))
+            self.assertTrue(np.allclose(normals[i], [n.r for n in posed.norms]))
+            self.assertEqual([v.group for v in posed.verts],
+                             [v.group for v in self.model.verts])
+
+    def test_frame_indices(self):
+        self.assertEqual(self.anim.frame_indices.tolist(), list(range(10)))
+
+    def test_apply_to_model(self):
+        # the second group is only translated
+        posed = self.anim.frames[3].apply_to_model(self.model)
+        for v, orig in zip(posed.verts, self.model.verts):
+            if v.group == 1:
+                self.assertTrue(np.allclose(v.r, orig.r + [1, 0, -0.5]))
+
+    def test_bake_threads_and_dtype(self):
+        serial = self.anim.bake(self.model, threads=1)
+        threaded = self.anim.bake(self.model, chunk_size=2, threads=4)
+        self.assertEqual(serial[0].dtype, np.float32)
+        self.assertTrue(np.array_equal(serial[0], threaded[0]))
+        self.assertTrue(np.array_equal(serial[1], threaded[1]))
+
+        half = self.anim.bake(self.model, dtype=np.float16)
+        self.assertEqual(half[0].dtype, np.float16)
+        self.assertTrue(np.allclose(half[0], serial[0], atol=1e-2))
+
+    def test_bake_memmap(self):
+        prefix = os.path.join(self.temp_dir, "baked")
+        positions, normals = self.anim.bake(self.model, filename=prefix)
+        expected = self.anim.bake(self.model)
+        del positions, normals
+        self.assertTrue(np.array_equal(np.load(prefix+"_positions.npy"), expected[0]))
+        self.assertTrue(np.array_equal(np.load(prefix+"_normals.npy"), expected[1]))
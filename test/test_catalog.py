@@ -0,0 +1,83 @@
+import unittest
+import os
+import shutil, tempfile
+
+import catalog
+from test.xspd_data import make_xspd, make_anim, make_old_anim, SIMPLE_MODEL
+
+IDENTITY = ((4096, 0, 0, 0), (0, 0, 0))
+
+class CatalogTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.wads = [os.path.join(self.temp_dir, "{i}.wad".format(i=i)) for i in range(3)]
+        self.write_wad(0, [SIMPLE_MODEL], [make_anim(2, [[IDENTITY]*2]*3)])
+        self.write_wad(1, [SIMPLE_MODEL, SIMPLE_MODEL], [make_old_anim(5, 4)])
+        self.write_wad(2, [], [make_anim(2, [[IDENTITY]*2])])
+        self.catalog = catalog.Catalog(os.path.join(self.temp_dir, "catalog.db"))
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.temp_dir)
+
+    def write_wad(self, i, models, anims):
+        with open(self.wads[i], "wb") as f:
+            f.write(make_xspd(models, anims, b"\x00"*16))
+
+    def test_index(self):
+        self.assertEqual(sorted(self.catalog.update(self.wads, processes=2)), sorted(self.wads))
+        self.assertEqual(len(self.catalog.find_models()), 3)
+        self.assertEqual(len(self.catalog.find_models(groups=2)), 3)
+        old = self.catalog.find_anims(new=False)
+        self.assertEqual(len(old), 1)
+        self.assertEqual(old[0]["path"], self.wads[1])
+        self.assertEqual(old[0]["num_frames"], 4)
+        self.assertEqual(old[0]["stored_frames"], 0)
+        self.assertRaises(ValueError, self.catalog.find_models, colour=1)
+
+    def test_malformed_wad(self):
+        # a truncated block and a model header with unexpected data
+        bad = [os.path.join(self.temp_dir, "bad{i}.wad".format(i=i)) for i in range(2)]
+        with open(bad[0], "wb") as f:
+            f.write(make_xspd([SIMPLE_MODEL], [])[:0x820])
+        with open(bad[1], "wb") as f:
+            f.write(make_xspd([SIMPLE_MODEL[:0x50] + b"\x01" + SIMPLE_MODEL[0x51:]], []))
+
+        for processes in (1, 2):
+            with catalog.Catalog(":memory:") as cat:
+                paths = [self.wads[0]] + bad + [self.wads[1]]
+                self.assertEqual(sorted(cat.update(paths, processes=processes)), sorted(paths))
+                self.assertEqual(len(cat.find_models()), 3)
+                errors = cat.errors()
+                self.assertEqual([e["path"] for e in errors], bad)
+                self.assertIn("unpack", errors[0]["error"])
+                self.assertEqual(errors[1]["error"], "AssertionError")
+                # failures are not rescanned until they change
+                self.assertEqual(cat.update(paths, processes=processes), [])
+
+    def test_anims_for_model(self):
+        self.catalog.update(self.wads, processes=1)
+        anims = self.catalog.anims_for_model(self.wads[0], 0)
+        self.assertEqual([a["path"] for a in anims], [self.wads[0], self.wads[2]])
+        anims = self.catalog.anims_for_model(self.wads[0], 0, same_wad=True)
+        self.assertEqual([a["path"] for a in anims], [self.wads[0]])
+
+    def test_incremental(self):
+        self.catalog.update(self.wads, processes=1)
+        self.assertEqual(self.catalog.update(self.wads, processes=1), [])
+
+        # touching a file rescans it, but the contents are unchanged
+        st = os.stat(self.wads[0])
+        os.utime(self.wads[0], (st.st_atime, st.st_mtime+10))
+        self.assertEqual(self.catalog.update(self.wads, processes=1), [self.wads[0]])
+        self.assertEqual(self.catalog.update(self.wads, processes=1), [])
+
+        # modifying a file re-indexes it
+        self.write_wad(2, [SIMPLE_MODEL], [])
+        os.utime(self.wads[2], (st.st_atime, st.st_mtime+20))
+        self.catalog.update(self.wads, processes=1)
+        self.assertEqual(len(self.catalog.find_models()), 4)
+        self.assertEqual(len(self.catalog.find_anims()), 2)
+
+        self.catalog.update(self.wads[:1], processes=1, prune=True)
+        self.assertEqual(len(self.catalog.find_models()), 1)
@@ -0,0 +1,189 @@
+import unittest
+import os
+import struct
+import shutil, tempfile
+
+import numpy as np
+
+import cd
+import datdir
+
+def reference_edc(data):
+    edc = 0
+    for b in data:
+        edc = (edc >> 8) ^ int(cd.EDC_LUT[(edc ^ b) & 0xFF])
+    return edc
+
+def reference_ecc_block(src, major_count, minor_count, major_mult, minor_inc):
+    size = major_count*minor_count
+    dest = [0]*(2*major_count)
+    for major in range(major_count):
+        index = (major >> 1)*major_mult + (major & 1)
+        ecc_a = ecc_b = 0
+        for minor in range(minor_count):
+            temp = src[index]
+            index += minor_inc
+            if index >= size:
+                index -= size
+            ecc_a ^= temp
+            ecc_b ^= temp
+            ecc_a = int(cd.ECC_F_LUT[ecc_a])
+        ecc_a = int(cd.ECC_B_LUT[cd.ECC_F_LUT[ecc_a] ^ ecc_b])
+        dest[major] = ecc_a
+        dest[major+major_count] = ecc_a ^ ecc_b
+    return dest
+
+def make_sector(lba, data=b"", form2=False):
+    sector = bytearray(cd.SECTOR_SIZE)
+    sector[:12] = cd.SYNC
+    m, s = divmod(lba+150, 75*60)
+    s, f = divmod(s, 75)
+    bcd = lambda n: (n//10) << 4 | n % 10
+    sector[12:16] = bytes([bcd(m), bcd(s), bcd(f), 2])
+    submode = 0x20 if form2 else 0x08
+    sector[16:24] = bytes([0, 0, submode, 0])*2
+    sector[24:24+len(data)] = data
+    return sector
+
+def make_record(name, lba, size, is_dir=False):
+    name = name.encode("ascii")
+    length = 33 + len(name) + (1 - len(name) % 2)
+    rec = bytearray(length)
+    rec[0] = length
+    rec[2:10] = struct.pack("<I", lba) + struct.pack(">I", lba)
+    rec[10:18] = struct.pack("<I", size) + struct.pack(">I", size)
+    rec[25] = cd.DIRECTORY_FLAG if is_dir else 0
+    rec[32] = len(name)
+    rec[33:33+len(name)] = name
+    return bytes(rec)
+
+class CDTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.temp_dir, "image.bin")
+
+        # POTTER.DIR lists a single file inside POTTER.DAT
+        self.file_data = bytes(range(256))*20 # spans 3 sectors
+        potter_dir = struct.pack("<I", 1) + struct.pack("<12sII", b"TEST.WAD", 1000, 100)
+
+        sectors = [make_sector(lba) for lba in range(16)]
+        pvd = bytearray(2048)
+        pvd[0:6] = b"\x01CD001"
+        pvd[cd.ROOT_RECORD_OFFSET:cd.ROOT_RECORD_OFFSET+34] = make_record("\x00", 18, 2048, True)
+        sectors.append(make_sector(16, pvd))
+        sectors.append(make_sector(17, b"\xffCD001"))
+        root = (make_record("\x00", 18, 2048, True) + make_record("\x01", 18, 2048, True)
+                + make_record("DATA", 19, 2048, True))
+        sectors.append(make_sector(18, root))
+        sub = (make_record("\x00", 19, 2048, True) + make_record("\x01", 18, 2048, True)
+               + make_record("POTTER.DAT;1", 20, len(self.file_data))
+               + make_record("POTTER.DIR;1", 23, len(potter_dir))
+               + make_record("MOVIE.STR;1", 24, 2048))
+        sectors.append(make_sector(19, sub))
+        for i in range(3):
+            sectors.append(make_sector(20+i, self.file_data[i*2048:(i+1)*2048]))
+        sectors.append(make_sector(23, potter_dir))
+        sectors.append(make_sector(24, b"\x55"*2324, form2=True))
+
+        raw = np.frombuffer(b"".join(sectors), dtype=np.uint8).reshape(-1, cd.SECTOR_SIZE).copy()
+        cd.regenerate_sectors(raw)
+        with open(self.fn, "wb") as f:
+            f.write(raw.tobytes())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_edc_matches_reference(self):
+        rng = np.random.RandomState(0)
+        blocks = rng.randint(0, 256, size=(3, 2056)).astype(np.uint8)
+        edc = cd.compute_edc(blocks)
+        for i in range(3):
+            self.assertEqual(int(edc[i]), reference_edc(blocks[i].tolist()))
+
+    def test_ecc_matches_reference(self):
+        rng = np.random.RandomState(1)
+        sector = make_sector(20, bytes(rng.randint(0, 256, size=2048).astype(np.uint8)))
+        raw = np.frombuffer(bytes(sector), dtype=np.uint8).reshape(1, -1).copy()
+        cd.regenerate_sectors(raw)
+        out = raw[0].tolist()
+
+        self.assertEqual(struct.unpack("<I", bytes(out[2072:2076]))[0],
+                         reference_edc(out[16:2072]))
+        src = [0]*4 + out[16:2248]
+        p = reference_ecc_block(src, 86, 24, 2, 86)
+        self.assertEqual(out[2076:2248], p)
+        q = reference_ecc_block(src, 52, 43, 86, 88)
+        self.assertEqual(out[2248:2352], q)
+
+    def test_form2_edc(self):
+        with cd.CDImage(self.fn) as image:
+            out = image.read_sectors(24)[0].tolist()
+        self.assertEqual(struct.unpack("<I", bytes(out[2348:2352]))[0],
+                         reference_edc(out[16:2348]))
+
+    def test_cue(self):
+        cue = os.path.join(self.temp_dir, "image.cue")
+        with open(cue, "w") as f:
+            f.write('FILE "image.bin" BINARY\n  TRACK 01 MODE2/2352\n    INDEX 01 00:00:00\n')
+        with cd.CDImage(cue) as image:
+            self.assertEqual(image.filename, self.fn)
+
+    def test_find_and_read(self):
+        with cd.CDImage(self.fn) as image:
+            self.assertEqual([r.name for r in image.listdir("data")],
+                             ["POTTER.DAT", "POTTER.DIR", "MOVIE.STR"])
+            with image.open("DATA\\potter.dat") as f:
+                self.assertEqual(f.read(), self.file_data)
+                f.seek(2040)
+                self.assertEqual(f.read(16), self.file_data[2040:2056])
+            self.assertRaises(FileNotFoundError, image.find, "DATA/MISSING.WAD")
+
+    def test_datdir_on_image(self):
+        with cd.CDImage(self.fn) as image:
+            archive = datdir.DAT(image.open("DATA/POTTER.DAT"), image.open("DATA/POTTER.DIR"))
+            self.assertEqual(archive.names(), ["TEST.WAD"])
+            wad = archive.open("test.wad")
+            self.assertEqual(wad.read(), self.file_data[100:1100])
+
+    def test_write_regenerates_touched_sectors(self):
+        with open(self.fn, "rb") as f:
+            before = f.read()
+
+        patch = b"\xaa"*100
+        with cd.CDImage(self.fn, writable=True) as image:
+            with image.open("DATA/POTTER.DAT") as f:
+                f.seek(2000)
+                f.write(patch)
+                f.seek(0)
+                expected = self.file_data[:2000] + patch + self.file_data[2100:]
+                self.assertEqual(f.read(), expected)
+                f.seek(len(self.file_data)-1)
+                self.assertRaises(ValueError, f.write, b"\x00\x00")
+
+        with open(self.fn, "rb") as f:
+            after = f.read()
+        size = cd.SECTOR_SIZE
+        # only sectors 20 and 21 should have changed
+        self.assertEqual(before[:20*size], after[:20*size])
+        self.assertEqual(before[22*size:], after[22*size:])
+        for lba in (20, 21):
+            out = list(after[lba*size:(lba+1)*size])
+            self.assertEqual(struct.unpack("<I", bytes(out[2072:2076]))[0],
+                             reference_edc(out[16:2072]))
+            src = [0]*4 + out[16:2248]
+            self.assertEqual(out[2076:2248], reference_ecc_block(src, 86, 24, 2, 86))
+            self.assertEqual(out[2248:2352], reference_ecc_block(src, 52, 43, 86, 88))
+
+    def test_form2_sectors(self):
+        with cd.CDImage(self.fn, writable=True) as image:
+            with image.open("DATA/MOVIE.STR") as f:
+                self.assertRaises(ValueError, f.read)
+                self.assertRaises(ValueError, f.write, b"\x00")
+            self.assertRaises(ValueError, image.read_sectors, 24, 2)
+            self.assertEqual(image.read_sectors(24).shape, (1, cd.SECTOR_SIZE))
+
+    def test_readonly(self):
+        with cd.CDImage(self.fn) as image:
+            with image.open("DATA/POTTER.DAT") as f:
+                self.assertFalse(f.writable())
+                self.assertRaises(OSError, f.write, b"\x00")
@@ -0,0 +1,84 @@
+import unittest
+import io
+
+import numpy as np
+
+import mesh
+import xspd
+from model import Vertex, Normal, Face, Model
+from test.xspd_data import make_xspd, SIMPLE_MODEL
+
+def grid_model(n):
+    """\
+An n x n grid of quads where every quad has its own copy of its
+vertices, as they would be before welding."""
+    verts = []
+    norms = []
+    faces = []
+    for y in range(n):
+        for x in range(n):
+            base = len(verts)
+            # stored order is v1 v2 v4 v3 around the quad
+            for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1)):
+                verts.append(Vertex(x+dx, y+dy, 0, 0))
+                norms.append(Normal(0, 0, 1, 0))
+            faces.append(Face((base, base+1, base+2, base+3), Normal(0, 0, 1, 0), 0, 0))
+    return Model(verts, norms, faces, 1)
+
+def triangle_set(positions, triangles):
+    """\
+Set of triangles as tuples of positions, rotated so that winding is
+preserved but the starting vertex doesn't matter."""
+    out = set()
+    for tri in triangles:
+        pts = [tuple(positions[v]) for v in tri]
+        i = pts.index(min(pts))
+        out.add(tuple(pts[i:] + pts[:i]))
+    return out
+
+class MeshTests(unittest.TestCase):
+    def test_triangulate(self):
+        faces = [Face((0, 1, 2, 3), None, 0, 0), Face((4, 5, 6, 0), None, 1, 0)]
+        tris = mesh.triangulate(faces)
+        # the quad is v1 v2 v4 v3 in save_obj
+        self.assertEqual(tris.tolist(), [[0, 1, 3], [0, 3, 2], [4, 5, 6]])
+
+    def test_triangulate_xspd_model(self):
+        block = xspd.XSPD(io.BytesIO(make_xspd([SIMPLE_MODEL], [])), 0)
+        model = block.read_models(0)
+        # the quad becomes two triangles and the tri stays as one
+        self.assertEqual(model.to_mesh(weld=False, optimise=False).triangles.tolist(),
+                         [[0, 1, 2], [0, 2, 3], [4, 5, 6]])
+
+    def test_weld(self):
+        model = grid_model(4)
+        m = model.to_mesh(optimise=False)
+        self.assertEqual(len(m.positions), 25)
+        self.assertEqual(len(m.triangles), 32)
+        self.assertEqual(m.indices.dtype, np.uint16)
+
+        unwelded = model.to_mesh(weld=False, optimise=False)
+        self.assertEqual(len(unwelded.positions), 64)
+        self.assertEqual(triangle_set(m.positions, m.triangles),
+                         triangle_set(unwelded.positions, unwelded.triangles))
+
+    def test_weld_keeps_groups_apart(self):
+        verts = [Vertex(0, 0, 0, 0), Vertex(1, 0, 0, 0), Vertex(0, 1, 0, 0),
+                 Vertex(0, 0, 0, 1), Vertex(1, 0, 0, 1), Vertex(0, 1, 0, 1)]
+        norms = [Normal(0, 0, 1, v.group) for v in verts]
+        faces = [Face((0, 1, 2, 0), None, 1, 0), Face((3, 4, 5, 0), None, 1, 0)]
+        m = Model(verts, norms, faces, 2).to_mesh()
+        self.assertEqual(len(m.positions), 6)
+        self.assertEqual(sorted(m.groups.tolist()), [0, 0, 0, 1, 1, 1])
+
+    def test_optimise(self):
+        model = grid_model(24)
+        plain = model.to_mesh(optimise=False)
+        m = model.to_mesh()
+        self.assertEqual(triangle_set(m.positions, m.triangles),
+                         triangle_set(plain.positions, plain.triangles))
+        self.assertLess(mesh.cache_miss_ratio(m.triangles, 16),
+                        mesh.cache_miss_ratio(plain.triangles, 16))
+        # vertices are numbered in order of first use
+        first_use = np.unique(m.indices, return_index=True)[1]
+        self.assertTrue((np.diff(first_use) > 0).all())
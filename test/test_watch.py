@@ -0,0 +1,113 @@
+import unittest
+import os
+import struct
+import shutil, tempfile
+
+from PIL import Image
+
+import img
+import watch
+from datdir import DAT
+
+test_dir = os.path.dirname(__file__)
+
+class WatchTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.edit_dir = os.path.join(self.temp_dir, "edit")
+        os.mkdir(self.edit_dir)
+
+        # archive containing a direct colour and a palette copy of the test image
+        with open(os.path.join(test_dir, "test.testimg"), "rb") as f:
+            self.direct = f.read()
+        with open(os.path.join(test_dir, "test.testpimg"), "rb") as f:
+            self.palette = f.read()
+        entries = [(b"DIRECT.IMG", len(self.direct), 0),
+                   (b"PALETTE.IMG", len(self.palette), len(self.direct))]
+        with open(os.path.join(self.temp_dir, "TEST.DIR"), "wb") as f:
+            f.write(struct.pack("<I", len(entries)))
+            for e in entries:
+                f.write(struct.pack("<12sII", *e))
+        with open(os.path.join(self.temp_dir, "TEST.DAT"), "wb") as f:
+            f.write(b"\x00"*(len(self.direct)+len(self.palette)))
+
+        self.dat = open(os.path.join(self.temp_dir, "TEST.DAT"), "r+b")
+        self.archive = DAT(self.dat, os.path.join(self.temp_dir, "TEST.DIR"))
+
+    def tearDown(self):
+        self.dat.close()
+        shutil.rmtree(self.temp_dir)
+
+    def read_dat(self):
+        self.dat.seek(0)
+        return self.dat.read()
+
+    def test_rebuild_changed_only(self):
+        im = Image.open(os.path.join(test_dir, "test.tif"))
+        im.save(os.path.join(self.edit_dir, "direct.png"))
+        im.save(os.path.join(self.edit_dir, "palette.png"))
+
+        with watch.Watcher(self.edit_dir, self.archive, processes=2) as w:
+            results = w.step()
+            self.assertEqual(sorted(os.path.basename(p) for p, e in results),
+                             ["direct.png", "palette.png"])
+            self.assertTrue(all(e is None for p, e in results))
+            self.assertEqual(self.read_dat(), self.direct+self.palette)
+
+            # nothing has changed
+            self.assertEqual(w.step(), [])
+
+            # rewriting the same contents is not a change
+            im.save(os.path.join(self.edit_dir, "direct.png"))
+            os.utime(os.path.join(self.edit_dir, "direct.png"), ns=(0, 0))
+            self.assertEqual(w.step(), [])
+
+    def test_validation(self):
+        im = Image.open(os.path.join(test_dir, "test.tif"))
+        im.resize((im.size[0]+1, im.size[1])).save(os.path.join(self.edit_dir, "direct.png"))
+        im.save(os.path.join(self.edit_dir, "missing.png"))
+
+        w = watch.Watcher(self.edit_dir, self.archive, processes=1)
+        results = dict((os.path.basename(p), e) for p, e in w.step())
+        self.assertIn("does not match", results["direct.png"])
+        self.assertIn("not in the archive", results["missing.png"])
+        self.assertEqual(self.read_dat(), b"\x00"*(len(self.direct)+len(self.palette)))
+
+    def test_patch_error(self):
+        im = Image.open(os.path.join(test_dir, "test.tif"))
+        im.save(os.path.join(self.edit_dir, "direct.png"))
+        with open(os.path.join(self.temp_dir, "TEST.DAT"), "rb") as dat:
+            archive = DAT(dat, os.path.join(self.temp_dir, "TEST.DIR"))
+            w = watch.Watcher(self.edit_dir, archive, processes=1)
+            results = w.step()
+        self.assertEqual(len(results), 1)
+        self.assertIsNotNone(results[0][1])
+        # the image is retried once the archive can be written
+        w.archive = self.archive
+        self.assertEqual([e for p, e in w.step()], [None])
+
+    def test_ambiguous_size(self):
+        # a 32x16 image is 1024 bytes as either type
+        fp = os.path.join(self.edit_dir, "small.png")
+        im = Image.open(os.path.join(test_dir, "test.tif")).resize((32, 16))
+        im.convert("RGB").convert("P").save(fp)
+        self.assertRaises(ValueError, watch.encode_to_size, fp, 1024)
+        self.assertEqual(watch.encode_to_size(fp, 1024, palette=True),
+                         img.encode_palette_IMG(Image.open(fp)))
+        self.assertEqual(watch.encode_to_size(fp, 1024, palette=False),
+                         img.encode_IMG(Image.open(fp)))
+        self.assertRaises(ValueError, watch.encode_to_size,
+                          os.path.join(test_dir, "test.tif"), len(self.direct), palette=True)
+
+    def test_baseline(self):
+        im = Image.open(os.path.join(test_dir, "test.tif"))
+        im.save(os.path.join(self.edit_dir, "direct.png"))
+        w = watch.Watcher(self.edit_dir, self.archive, processes=1, baseline=True)
+        self.assertEqual(w.step(), [])
+
+    def test_encode_to_size(self):
+        im = Image.open(os.path.join(test_dir, "test.tif"))
+        fp = os.path.join(self.edit_dir, "im.png")
+        im.save(fp)
+        self.assertEqual(watch.encode_to_size(fp, len(self.direct)), img.encode_IMG(im))
+        self.assertEqual(watch.encode_to_size(fp, len(self.palette)), img.encode_palette_IMG(im))
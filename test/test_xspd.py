@@ -0,0 +1,65 @@
+import unittest
+import os
+import io
+import shutil, tempfile
+
+import xspd
+from test.xspd_data import make_xspd, make_anim, make_old_anim, SIMPLE_MODEL
+
+IDENTITY = ((4096, 0, 0, 0), (0, 0, 0))
+
+class XSPDTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.temp_dir, "test.wad")
+        self.anims = [make_anim(2, [[IDENTITY]*2]*3), make_old_anim(5, 4)]
+        with open(self.fn, "wb") as f:
+            f.write(make_xspd([SIMPLE_MODEL, SIMPLE_MODEL], self.anims, b"\x00"*100))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_find_offset(self):
+        self.assertEqual(xspd.find_offset(self.fn), 100)
+        with open(self.fn, "rb") as f:
+            self.assertEqual(xspd.find_offset(io.BytesIO(f.read())), 100)
+
+    def test_find_offset_across_blocks(self):
+        # the tag starts in one block and ends in the next
+        for block_size in (101, 102, 103, 16, 7):
+            self.assertEqual(xspd.find_offset(self.fn, block_size), 100)
+        self.assertIsNone(xspd.find_offset(io.BytesIO(b"XSP"+b"\x00"*20+b"XSP"), 4))
+
+    def test_scan_models(self):
+        block = xspd.XSPD(self.fn, 100)
+        infos = block.scan_models()
+        models = block.read_models()
+        self.assertEqual(len(infos), 2)
+        for info, model in zip(infos, models):
+            self.assertEqual(info.vertices, len(model.verts))
+            self.assertEqual(info.faces, len(model.faces))
+            self.assertEqual(info.groups, model.groups)
+            self.assertEqual(info.size, len(SIMPLE_MODEL))
+        self.assertEqual(infos[0].hash, infos[1].hash)
+        self.assertEqual(infos[1].offset, infos[0].offset+infos[0].size)
+
+    def test_read_faces(self):
+        model = xspd.XSPD(self.fn, 100).read_models(0)
+        self.assertEqual([f.group for f in model.faces], [0, 1])
+        self.assertEqual([v.group for v in model.verts], [0, 0, 0, 0, 1, 1, 1])
+        self.assertEqual([f.verts for f in model.faces], [(0, 1, 3, 2), (4, 5, 6, 0)])
+
+    def test_scan_anims(self):
+        block = xspd.XSPD(self.fn, 100)
+        infos = block.scan_anims()
+        self.assertEqual([a.new for a in infos], [True, False])
+        self.assertEqual([a.groups for a in infos], [2, 5])
+        self.assertEqual([a.num_frames for a in infos], [3, 4])
+        self.assertEqual([a.stored_frames for a in infos], [3, 0])
+        self.assertEqual([a.size for a in infos], [len(a) for a in self.anims])
+
+    def test_read_anims(self):
+        block = xspd.XSPD(self.fn, 100)
+        anims = block.read_anims()
+        self.assertEqual([a.groups for a in anims], [2, 5])
+        self.assertEqual([len(a.frames) for a in anims], [3, 4])
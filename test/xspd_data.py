@@ -0,0 +1,70 @@
+"""\
+Helpers for building small synthetic XSPD blocks for the tests.
+"""
+
+import struct
+
+def make_model(vertices, normals, faces):
+    """\
+vertices and normals are lists of (x, y, z, flag) tuples of raw
+values, faces a list of (normal, verts, texture) tuples where normal
+is an (x, y, z, flag) tuple and verts has 4 indices."""
+    data = b"\x00"*0x48
+    data += struct.pack("<I", len(vertices)) + b"\x00"*8
+    data += struct.pack("<I", len(faces)) + b"\x00"*4
+    data += struct.pack("<3H", 0, 0, 0) + b"\x00"*6
+    for v in vertices:
+        data += struct.pack("<3hH", *v)
+    for n in normals:
+        data += struct.pack("<3hH", *n)
+    for n, verts, texture in faces:
+        data += struct.pack("<3hH", *n)
+        data += struct.pack("<4H", *verts)
+        data += struct.pack("<HH", texture, 0)
+    return data
+
+def make_anim(groups, frames):
+    """\
+Builds a new style animation. frames is a list of frames, each a list
+of (quat, trans) per group with raw (4096 scaled) wxyz quaternions
+and translations."""
+    num_frames = len(frames)
+    data = struct.pack("<II", 0, 0)
+    data += struct.pack("<II", num_frames, 1) + b"\x00"*8
+    data += struct.pack("<I", groups) + b"\x00"*4
+    data += struct.pack("<I", len(frames)) + b"\x00"*0xC
+    data += b"\x00"*(4*num_frames + 4*len(frames))
+    for i, frame in enumerate(frames):
+        for quat, trans in frame:
+            data += struct.pack("<4h3hH", *quat, *trans, i)
+    return data
+
+def make_old_anim(groups, num_frames):
+    """\
+Builds an old style animation with identity matrices."""
+    data = struct.pack("<II", 0, 0)
+    data += struct.pack("<II", num_frames, 1) + b"\x00"*8
+    data += struct.pack("<I", groups) + b"\x00"*4
+    data += struct.pack("<I", 0) + b"\x00"*0xC
+    data += b"\x00"*(4*num_frames)
+    for f in range(num_frames):
+        for g in range(groups):
+            data += struct.pack("<9h3h", 32767, 0, 0, 0, 32767, 0, 0, 0, 32767, 0, 0, 0)
+    return data
+
+def make_xspd(models, anims, prefix=b""):
+    """\
+Builds the contents of a WAD file containing an XSPD block, optionally
+preceded by prefix."""
+    body = b"\x00"*(0x810-8)
+    body += struct.pack("<I", len(models)) + b"".join(models)
+    body += struct.pack("<I", len(anims)) + b"".join(anims)
+    return prefix + b"XSPD" + struct.pack("<I", len(body)) + body
+
+# a two group model: a quad in group 0 and a triangle in group 1
+SIMPLE_MODEL = make_model(
+    [(0, 0, 0, 0), (4096, 0, 0, 0), (4096, 4096, 0, 0), (0, 4096, 0, 1),
+     (0, 0, 4096, 0), (4096, 0, 4096, 0), (0, 4096, 4096, 1)],
+    [(0, 0, -4096, 0)]*3 + [(0, 0, -4096, 1)] + [(0, -4096, 0, 0)]*2 + [(0, -4096, 0, 1)],
+    [((0, 0, -4096, 1), (0, 1, 3, 2), 0), # flag makes the next face a tri
+     ((0, -4096, 0, 0), (4, 5, 6, 0), 0)])
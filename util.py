@@ -0,0 +1,33 @@
+"""\
+Small file helpers shared by the other modules.
+"""
+
+import io
+import os
+import hashlib
+import contextlib
+from typing import Union
+
+@contextlib.contextmanager
+def open_file(f:Union[str, io.IOBase], mode:str="rb"):
+    """\
+Opens f if it is a path, otherwise assumes it is already a file-like
+object and uses it as-is. Should be used as a context manager; file
+objects that are passed in are not closed on exit."""
+    if isinstance(f, (str, bytes, os.PathLike)):
+        with open(f, mode) as fobj:
+            yield fobj
+    else:
+        yield f
+
+def hash_file(fn:str) -> str:
+    """\
+Returns the SHA-1 hash of the file at fn."""
+    BS = 4194304
+    h = hashlib.sha1()
+    with open(fn, "rb") as f:
+        b = f.read(BS)
+        while len(b) > 0:
+            h.update(b)
+            b = f.read(BS)
+    return h.hexdigest()
@@ -0,0 +1,195 @@
+"""\
+Watch mode for modding: monitors a directory of edited images and
+patches the re-encoded IMG files straight into a DAT/DIR archive
+whenever they change.
+"""
+
+import io
+import os
+import time
+import hashlib
+from multiprocessing import Pool
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from img import encode_IMG, encode_palette_IMG
+from util import hash_file
+from datdir import DAT
+
+IMAGE_EXTENSIONS = (".png", ".bmp", ".tif", ".tiff", ".gif")
+
+def encode_to_size(fp, size:int, palette:Optional[bool]=None) -> bytes:
+    """\
+Encodes the image at fp (a path or file-like object) as an IMG file
+of the given size in bytes. The type of IMG (direct colour or
+palette) is determined by which one gives the right size for the
+dimensions of the image. Raises a ValueError if neither does.
+
+Images with 512 pixels give the same size either way, so for these
+palette must be set to True or False to choose the type; otherwise a
+ValueError is raised. If palette is set for other images, it must
+agree with the size."""
+    im = Image.open(fp)
+    width, height = im.size
+    is_direct = size == 2*width*height
+    is_palette = size == 512 + width*height
+    if is_direct and is_palette and palette is None:
+        raise ValueError("{w}x{h} image fits both IMG types at {s} bytes;"
+                         " the type must be given".format(w=width, h=height, s=size))
+    if is_direct and palette is not True:
+        data = encode_IMG(im)
+    elif is_palette and palette is not False:
+        data = encode_palette_IMG(im)
+    else:
+        raise ValueError("{w}x{h} image does not match IMG size of {s} bytes".format(
+            w=width, h=height, s=size))
+    assert len(data) == size
+    return data
+
+def _encode_job(args):
+    path, name, size, palette = args
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        return path, name, digest, encode_to_size(io.BytesIO(raw), size, palette), None
+    except (ValueError, OSError) as e:
+        return path, name, None, None, str(e)
+
+class Watcher(object):
+    def __init__(self, directory:str, archive:DAT, processes:Optional[int]=None,
+                 baseline:bool=False, palette:Optional[Dict[str, bool]]=None):
+        """\
+Watches directory for edited images and patches them into archive.
+Images are matched to archive entries by name, so FOO.png replaces
+FOO.IMG. The archive must have been opened with a writable .DAT file
+(this can also be a file on a writable cd.CDImage).
+
+Images are re-encoded in a pool of worker processes (processes=None
+uses one per CPU, processes=1 encodes in the current process). If
+baseline is True, the images that are already in the directory are
+assumed to be in the archive already and will only be patched once
+they change.
+
+The type of each IMG is worked out from the size of its archive
+entry. Entries of 1024 bytes could be either type (512 pixels), so
+their type has to be given in palette, which maps archive names to
+True for palette IMGs and False for direct colour (see
+encode_to_size).
+"""
+        self.directory = directory
+        self.archive = archive
+        self.processes = processes
+        self.palette = {k.upper(): v for k, v in (palette or {}).items()}
+        self.stats = {} # path -> (mtime, size)
+        self.hashes = {} # path -> hash of last patched contents
+        self.pool = None
+        if baseline:
+            for path in self.poll():
+                self.hashes[path] = hash_file(path)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def archive_name(self, path:str) -> str:
+        return os.path.splitext(os.path.basename(path))[0].upper() + ".IMG"
+
+    def poll(self) -> List[str]:
+        """\
+Returns the images whose contents have changed since they were last
+patched. Only files whose mtime or size have changed are hashed."""
+        changed = []
+        seen = set()
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            seen.add(entry.path)
+            st = entry.stat()
+            stat = (st.st_mtime_ns, st.st_size)
+            if self.stats.get(entry.path) == stat:
+                continue
+            self.stats[entry.path] = stat
+            if self.hashes.get(entry.path) != hash_file(entry.path):
+                changed.append(entry.path)
+        for path in list(self.stats):
+            if path not in seen:
+                del self.stats[path]
+        return changed
+
+    def rebuild(self, paths:List[str]) -> List[Tuple[str, Optional[str]]]:
+        """\
+Re-encodes the images at paths and patches them into the archive.
+Returns a list of (path, error) tuples, where error is None if the
+image was patched successfully. Images that could not be written to
+the archive are retried on the next poll; images that could not be
+encoded are retried once they change."""
+        jobs = []
+        results = []
+        for path in paths:
+            name = self.archive_name(path)
+            if name not in self.archive.entries:
+                results.append((path, name+" is not in the archive"))
+                continue
+            jobs.append((path, name, self.archive.entries[name].size,
+                         self.palette.get(name)))
+
+        if self.processes == 1 or len(jobs) <= 1:
+            encoded = map(_encode_job, jobs)
+        else:
+            if self.pool is None:
+                self.pool = Pool(self.processes)
+            encoded = self.pool.imap_unordered(_encode_job, jobs)
+
+        for path, name, digest, data, error in encoded:
+            if error is None:
+                try:
+                    with self.archive.open(name) as f:
+                        f.write(data)
+                    self.hashes[path] = digest
+                except (ValueError, OSError) as e:
+                    error = str(e)
+                    # the image itself is fine, so forget its stat to
+                    # retry it on the next poll
+                    self.stats.pop(path, None)
+            results.append((path, error))
+        self.archive.dat.flush()
+        return results
+
+    def step(self) -> List[Tuple[str, Optional[str]]]:
+        """\
+Polls the directory once and rebuilds any images that have changed."""
+        return self.rebuild(self.poll())
+
+    def run(self, interval:float=0.2, callback:Optional[Callable]=None):
+        """\
+Watches the directory until interrupted, polling every interval
+seconds. callback is called with the results of each rebuild that
+patched or failed on at least one image; by default these are
+printed."""
+        if callback is None:
+            callback = print_results
+        try:
+            while True:
+                results = self.step()
+                if results:
+                    callback(results)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+def print_results(results:List[Tuple[str, Optional[str]]]):
+    for path, error in results:
+        if error is None:
+            print("Patched", os.path.basename(path))
+        else:
+            print("Failed", os.path.basename(path)+":", error)
@@ -5,31 +5,52 @@ XSPD Block Decoder
 import struct
 import os
 import io
+import hashlib
+from collections import namedtuple
 
 #import numpy as np
+from util import open_file
 from model import Vertex, Normal, Face, Model
 from anims import NewSubframe, OldSubframe, Frame, Animation
 
-def find_offset(fn:str):
+# metadata read by XSPD.scan_models and XSPD.scan_anims
+# offsets and sizes are relative to the start of the XSPD block
+ModelInfo = namedtuple("ModelInfo", ["index", "offset", "size", "vertices",
+                                     "faces", "groups", "hash"])
+AnimInfo = namedtuple("AnimInfo", ["index", "offset", "size", "new",
+                                   "num_frames", "stored_frames", "groups",
+                                   "hash"])
+
+def find_offset(fn, block_size:int=4194304):
     """\
 Finds the offset for the XSPD block. At the moment this just searches
 the file for the XSPD header, but in future this will use the offsets
 of the other blocks to seek to the correct location.
+fn may be a path or a file-like object (such as a cd.CDFile).
 """
-    BS = 4194304
-    with open(fn, "rb") as wad:
-        count = 0
-        b = wad.read(BS)
+    with open_file(fn) as wad:
+        wad.seek(0)
+        start = 0 # offset of b in the file
+        b = wad.read(block_size)
         while len(b) > 0:
-            if b"XSPD" in b:
-                return b.find(b"XSPD") + BS*count
-            count += 1
+            i = b.find(b"XSPD")
+            if i >= 0:
+                return start + i
+            # keep the end of the block in case the tag crosses
+            # into the next one
+            tail = b[-3:]
+            new = wad.read(block_size)
+            if len(new) == 0:
+                break
+            start += len(b) - len(tail)
+            b = tail + new
 
 class XSPD(object):
-    def __init__(self, fn:str, offset:int):
+    def __init__(self, fn, offset:int):
         """\
 Object representing the XSPD block of a WAD file. The object
-requires a path to a WAD file and an offset to the XSPD block.
+requires a path to a WAD file (or a file-like object, such as a
+cd.CDFile) and an offset to the XSPD block.
 The raw bytes will be stored in the object and can be
 processed further to extract data.
 """
@@ -41,7 +62,7 @@ processed further to extract data.
         self._models_end = None
 
         # read the wad file
-        with open(fn, "rb") as wad:
+        with open_file(fn) as wad:
             wad.seek(offset)
 
             # verify the header
@@ -72,27 +93,7 @@ access to animations in future."""
         for m in range(num_models):
             if verbose:
                 print("\n== Model {i} ==".format(i=m+1))
-            # skip unknown data
-            self.data.read(0x48)
-
-            vertex_count = struct.unpack("<I", self.data.read(4))[0]
-            if verbose:
-                print("Vertices:", vertex_count)
-            assert int(self.data.read(8).hex(), 16) == 0
-
-            face_count = struct.unpack("<I", self.data.read(4))[0]
-            if verbose:
-                print("Faces:", face_count)
-            assert int(self.data.read(4).hex(), 16) == 0
-
-            ed1,ed2,ed3 = struct.unpack("<3H", self.data.read(2*3))
-            if verbose:
-                print("Extended:", ed1, ed2, ed3)
-
-            # skip some null data
-            # for Harry Potter 1, this is 0x6
-            # Harry Potter 2 is unknown
-            assert int(self.data.read(0x6).hex(), 16) == 0
+            vertex_count, face_count, ed = self._read_model_header(verbose)
 
             # prepare for reading vertices
             self.current_group = 0
@@ -122,7 +123,7 @@ access to animations in future."""
 
             # skip extended data
             # in HP1, extended data size is 0x20
-            self.data.read(0x20 * (ed1+ed2+ed3))
+            self.data.read(0x20 * ed)
 
             if n is None or n == m:
                 model = Model(vertices, normals, faces, groups)
@@ -137,6 +138,64 @@ access to animations in future."""
             return models[0]
         return models
 
+    def scan_models(self):
+        """\
+Reads the headers of the models in the block without decoding
+their vertices, normals or faces. Returns a list of ModelInfo.
+The end of the models section is stored, as with read_models."""
+        self.data.seek(0x810)
+        num_models = struct.unpack("<I", self.data.read(4))[0]
+
+        models = []
+        for m in range(num_models):
+            start = self.data.tell()
+            vertex_count, face_count, ed = self._read_model_header()
+
+            # the group count is the number of vertices that
+            # start a new group
+            vertex_data = self.data.read(8*vertex_count)
+            groups = sum(1 for v in struct.iter_unpack("<3hH", vertex_data)
+                         if v[3] == 1)
+
+            # skip normals, faces and extended data
+            self.data.read(8*vertex_count + 20*face_count + 0x20*ed)
+
+            end = self.data.tell()
+            models.append(ModelInfo(m, start, end-start, vertex_count,
+                                    face_count, groups,
+                                    self._hash_range(start, end)))
+
+        self._models_end = self.data.tell()
+        return models
+
+    def _read_model_header(self, verbose=False):
+        # skip unknown data
+        self.data.read(0x48)
+
+        vertex_count = struct.unpack("<I", self.data.read(4))[0]
+        if verbose:
+            print("Vertices:", vertex_count)
+        assert int(self.data.read(8).hex(), 16) == 0
+
+        face_count = struct.unpack("<I", self.data.read(4))[0]
+        if verbose:
+            print("Faces:", face_count)
+        assert int(self.data.read(4).hex(), 16) == 0
+
+        ed1,ed2,ed3 = struct.unpack("<3H", self.data.read(2*3))
+        if verbose:
+            print("Extended:", ed1, ed2, ed3)
+
+        # skip some null data
+        # for Harry Potter 1, this is 0x6
+        # Harry Potter 2 is unknown
+        assert int(self.data.read(0x6).hex(), 16) == 0
+
+        return vertex_count, face_count, ed1+ed2+ed3
+
+    def _hash_range(self, start:int, end:int) -> str:
+        return hashlib.sha1(self.data.getbuffer()[start:end]).hexdigest()
+
     def _read_vertex(self):
         x, y, z = struct.unpack("<3h", self.data.read(2*3))
         vertex = Vertex(x, y, z, self.current_group)
@@ -183,12 +242,12 @@ access to animations in future."""
     def read_anims(self, verbose=False):
         """\
 Read animations from the file. Since there is no easy way
-to jump to the animations, the models must all be read
-first. Once the models have been read once it will be
-possible to jump to the animations.
+to jump to the animations, the model headers must all be
+scanned first. Once the models have been read or scanned
+once it will be possible to jump to the animations.
 """
         if self._models_end is None:
-            self.read_models()
+            self.scan_models()
 
         self.data.seek(self._models_end)
         num_anims = struct.unpack("<I", self.data.read(4))[0]
@@ -199,48 +258,7 @@ possible to jump to the animations.
         for a in range(num_anims):
             if verbose:
                 print("\n== Anim {i} ==".format(i=a+1))
-            # unknown counter, used later
-            uc = struct.unpack("<I", self.data.read(4))[0]
-
-            assert int(self.data.read(4).hex(), 16) == 0
-
-            # number of frames, including interpolated frames
-            num_frames = struct.unpack("<I", self.data.read(4))[0]
-            if verbose:
-                print("Length:", num_frames, "frames")
-
-            # another unknown value
-            uk = struct.unpack("<I", self.data.read(4))[0]
-
-            assert int(self.data.read(8).hex(), 16) == 0
-
-            # number of vertex groups
-            # can be used to associate an animation with a model
-            groups = struct.unpack("<I", self.data.read(4))[0]
-            if verbose:
-                print("Vertex Groups:", groups)
-
-            assert int(self.data.read(4).hex(), 16) == 0
-
-            # number of stored frames
-            # if zero, uses old animation format
-            stored_frames = struct.unpack("<I", self.data.read(4))[0]
-            if stored_frames == 0:
-                new = False
-                if verbose:
-                    print("Old anim format")
-            else:
-                new = True
-                if verbose:
-                    print("New anim format,", stored_frames, "stored frames")
-
-            assert int(self.data.read(0xC).hex(), 16) == 0
-
-            # skip some unknown data
-            self.data.read(4*uc)
-            if uk == 0:
-                self.data.read(8*num_frames)
-            self.data.read(4*num_frames + 4*stored_frames)
+            num_frames, groups, stored_frames, new = self._read_anim_header(verbose)
 
             # read actual frames
             frames = []
@@ -257,6 +275,80 @@ possible to jump to the animations.
 
         return anims
 
+    def scan_anims(self):
+        """\
+Reads the headers of the animations in the block without decoding
+their frames. Returns a list of AnimInfo."""
+        if self._models_end is None:
+            self.scan_models()
+
+        self.data.seek(self._models_end)
+        num_anims = struct.unpack("<I", self.data.read(4))[0]
+
+        anims = []
+        for a in range(num_anims):
+            start = self.data.tell()
+            num_frames, groups, stored_frames, new = self._read_anim_header()
+
+            # new subframes are 16 bytes, old subframes are 24 bytes
+            if new:
+                self.data.read(16*groups*stored_frames)
+            else:
+                self.data.read(24*groups*num_frames)
+
+            end = self.data.tell()
+            anims.append(AnimInfo(a, start, end-start, new, num_frames,
+                                  stored_frames, groups,
+                                  self._hash_range(start, end)))
+
+        return anims
+
+    def _read_anim_header(self, verbose=False):
+        # unknown counter, used later
+        uc = struct.unpack("<I", self.data.read(4))[0]
+
+        assert int(self.data.read(4).hex(), 16) == 0
+
+        # number of frames, including interpolated frames
+        num_frames = struct.unpack("<I", self.data.read(4))[0]
+        if verbose:
+            print("Length:", num_frames, "frames")
+
+        # another unknown value
+        uk = struct.unpack("<I", self.data.read(4))[0]
+
+        assert int(self.data.read(8).hex(), 16) == 0
+
+        # number of vertex groups
+        # can be used to associate an animation with a model
+        groups = struct.unpack("<I", self.data.read(4))[0]
+        if verbose:
+            print("Vertex Groups:", groups)
+
+        assert int(self.data.read(4).hex(), 16) == 0
+
+        # number of stored frames
+        # if zero, uses old animation format
+        stored_frames = struct.unpack("<I", self.data.read(4))[0]
+        if stored_frames == 0:
+            new = False
+            if verbose:
+                print("Old anim format")
+        else:
+            new = True
+            if verbose:
+                print("New anim format,", stored_frames, "stored frames")
+
+        assert int(self.data.read(0xC).hex(), 16) == 0
+
+        # skip some unknown data
+        self.data.read(4*uc)
+        if uk == 0:
+            self.data.read(8*num_frames)
+        self.data.read(4*num_frames + 4*stored_frames)
+
+        return num_frames, groups, stored_frames, new
+
     def _read_new_frame(self, num_groups):
         subframes = []
         for sf in range(num_groups):
@@ -306,5 +398,5 @@ possible to jump to the animations.
         tz /= 4096
 
         # pack into OldSubframe
-        return OldSubframe(group, [w,x,y,z], [tx,ty,tz])
+        return OldSubframe(group, matrix, [tx,ty,tz])
 